@@ -1,9 +1,13 @@
 // local directories (cross platform)
 use directories::ProjectDirs;
 // path handling
-use std::path::PathBuf;
+use std::path::{Path, PathBuf};
+// buffered writes
+use std::io::Write;
 // hashmap 
 use std::collections::HashMap;
+// memoisation inside closures
+use std::cell::RefCell;
 // command line argument parsing
 use clap::{Parser, Subcommand, Args};
 
@@ -100,6 +104,25 @@ struct ResolveArgs {
 }
 
 
+/// Arguments given to the duplicates command.
+#[derive(Args,Debug,Serialize,Deserialize,Clone)]
+struct DuplicatesArgs {
+    /// Recompute the checksums from the raw documents
+    /// instead of trusting the ones stored in the index.
+    #[arg(short, long, default_value="false")]
+    rehash: bool,
+}
+
+
+/// Arguments given to the export command.
+#[derive(Args,Debug,Serialize,Deserialize,Clone)]
+struct ExportArgs {
+    /// Output file name
+    #[arg(short, long)]
+    output: PathBuf,
+}
+
+
 /// Arguments given to the convert command.
 /// The URI must be a valid filepath to a pdf document.
 ///
@@ -124,6 +147,9 @@ struct ConvertArgs {
 struct Document {
     /// The SHA256 checksum of the original document
     /// seen as a string
+    ///
+    /// This is the checksum of the raw file, that is of the bytes
+    /// as downloaded or copied (see `INDEX_VERSION`).
     checksum : String,
 
     /// The filename of the document on the system.
@@ -158,13 +184,36 @@ struct Document {
 }
 
 
+/// A checksum previously computed for a file on the system.
+/// It remains valid as long as the size and the modification
+/// time of the file are unchanged.
+#[derive(Serialize, Deserialize,Clone,Debug)]
+struct CachedChecksum {
+    /// Modification time of the file in nanoseconds since the epoch.
+    mtime_ns : u64,
+
+    /// Size of the file in bytes.
+    size : u64,
+
+    /// The SHA256 checksum of the file.
+    checksum : String,
+}
+
+
 /// The main application state.
 #[derive(Serialize, Deserialize,Clone,Debug)]
 struct AppState {
-    /// File path to the index.yaml file 
+    /// File path to the index.json file 
     /// containing the catalog of available documents.
     index_path : PathBuf,
 
+    /// File path to the former index.yaml file,
+    /// migrated to `index_path` on the first load.
+    yaml_path  : PathBuf,
+
+    /// File path to the version of the index, see `INDEX_VERSION`.
+    version_path : PathBuf,
+
     /// File path to the directory containing
     /// the "raw" version of the documents. 
     raw_path   : PathBuf,
@@ -176,8 +225,34 @@ struct AppState {
     /// Path to the logs.
     log_path   : PathBuf,
 
-    /// Content of the index.yaml file, parsed.
+    /// File path to the cache of checksums.
+    checksums_path : PathBuf,
+
+    /// Content of the index.json file, parsed.
     index : Vec<Document>,
+
+    /// Checksums of the files already hashed, indexed by path.
+    checksums : HashMap<String, CachedChecksum>,
+
+    /// Position in the index of the document having a given identifier.
+    #[serde(skip)]
+    by_identifier : HashMap<String, usize>,
+
+    /// Positions in the index of the documents having a given checksum.
+    #[serde(skip)]
+    by_checksum : HashMap<String, Vec<usize>>,
+
+    /// Whether the index and the checksums were loaded.
+    #[serde(skip)]
+    loaded : bool,
+
+    /// Whether the index changed since it was loaded.
+    #[serde(skip)]
+    index_dirty : bool,
+
+    /// Whether the checksums changed since they were loaded.
+    #[serde(skip)]
+    checksums_dirty : bool,
 }
 
 //// COMMAND LINE INTERFACE /////
@@ -237,11 +312,29 @@ enum Commands {
     /// suitable to be used with ROFI/FZF/Dmenu.
     Find,
 
+    /// List the documents of the library that share
+    /// the same contents.
+    Duplicates(DuplicatesArgs),
+
+    /// Export the index of the library as a YAML file.
+    Export(ExportArgs),
+
     /// Imports a document into the library.
     /// (does perform a conversion)
     Import(ImportArgs),
 }
 
+impl Commands {
+    /// Whether the command reads or modifies the library.
+    /// Other commands do not pay for loading the index.
+    fn needs_library(&self) -> bool {
+        match self {
+            Commands::Cite(_) | Commands::Convert(_) | Commands::View(_) => { false }
+            _ => { true }
+        }
+    }
+}
+
 #[derive(Debug,Clone)]
 enum ParsedURI {
     HttpURL (String),
@@ -281,27 +374,44 @@ fn command_to_query(cmd : Commands) -> Result<String> {
             Ok(format!("akl://{name}/?{params}"))
         }
         Commands::Import(a) => {
+            // the arguments contain lists, which cannot be url
+            // encoded: they travel as a JSON payload instead.
             let name = "import-document";
-            let params = serde_urlencoded::to_string(a)?;
+            let payload = serde_json::to_string(&a)?;
+            let params = serde_urlencoded::to_string(ImportQuery { payload })?;
             Ok(format!("akl://{name}/?{params}"))
         }
         Commands::Find => {
             let name = "find-document";
             Ok(format!("akl://{name}/"))
         }
+        Commands::Duplicates(a) => {
+            let name = "list-duplicates";
+            let params = serde_urlencoded::to_string(a)?;
+            Ok(format!("akl://{name}/?{params}"))
+        }
+        Commands::Export(a) => {
+            let name = "export-library";
+            let params = serde_urlencoded::to_string(a)?;
+            Ok(format!("akl://{name}/?{params}"))
+        }
     }
 }
 
+/// Query of an import command: the arguments
+/// are given as a JSON payload.
+#[derive(Serialize,Deserialize)]
+struct ImportQuery {
+    payload : String,
+}
+
 /// Converts from a query string and command name
 /// to a parsed command result.
 fn query_to_command(name : &str, query : &str) -> Result<Commands> {
     match name {
         "import-document" => {
-            let mut keys = serde_urlencoded::from_str::<HashMap<String,String>>(query)
-                .context("Decoding the import url")?;
-
-            let payload = keys.remove("payload")
-                .context("Searching for the payload of import args")?;
+            let ImportQuery { payload } = serde_urlencoded::from_str(query)
+                .context("Decoding the payload of the import url")?;
 
             let import_args = serde_json::from_str(&payload)
                 .context("Parsing the payload of the import args")?;
@@ -325,6 +435,12 @@ fn query_to_command(name : &str, query : &str) -> Result<Commands> {
         "find-document" => {
             Ok(Commands::Find)
         }
+        "list-duplicates" => {
+            Ok(Commands::Duplicates(serde_urlencoded::from_str(query)?))
+        }
+        "export-library" => {
+            Ok(Commands::Export(serde_urlencoded::from_str(query)?))
+        }
         _ => {
             anyhow::bail!("Invalid command name {name}")
         }
@@ -417,10 +533,11 @@ fn uri_or_filepath_dispatch (uri : &str) -> Result<ParsedURI> {
     match uri_dispatch (uri) {
         Ok(r) => { Ok(r) }
         Err(e) => {
-            let s : String = uri.into();
-            let p = PathBuf::from(s);
-            if p.exists() {
-                Ok(ParsedURI::FilePath(p))
+            // something with an explicit scheme is not a path:
+            // there is no need to ask the filesystem about it.
+            let p = Path::new(uri);
+            if !uri.contains("://") && p.exists() {
+                Ok(ParsedURI::FilePath(p.to_path_buf()))
             } else {
                 log::error!("Error when parsing the uri {e:?}");
                 log::error!("The url {uri} is neither a valid scheme nor a path on the system");
@@ -432,15 +549,38 @@ fn uri_or_filepath_dispatch (uri : &str) -> Result<ParsedURI> {
 
 
 
+/// Maximal length (in bytes) of the authors and
+/// of the title parts of a generated filename.
+const NAME_PART_LENGTH : usize = 30;
+
+/// Pushes a character, unless it would make the string
+/// longer than `NAME_PART_LENGTH`. Returns whether
+/// the character was pushed.
+fn push_bounded(s : &mut String, c : char) -> bool {
+    if s.len() + c.len_utf8() > NAME_PART_LENGTH {
+        return false;
+    }
+    s.push(c);
+    true
+}
+
 /// Stupid words that should not be part of a title.
 ///
-/// TODO: sort the words to improve binary search.
+/// The words are sorted, so that membership can be
+/// tested by binary search: keep them sorted!
 const STUPID_WORDS : &[&str] = &[
-    "the", "all", "any", "one", "on", "of",
-    "in", "where", "when", "why", "what",
-    "this", "some", "other", "every"
+    "all", "any", "every", "in", "of", "on",
+    "one", "other", "some", "the", "this",
+    "what", "when", "where", "why"
 ];
 
+/// Whether a word is one of the `STUPID_WORDS`, ignoring ASCII case.
+fn is_stupid_word(word : &str) -> bool {
+    STUPID_WORDS.binary_search_by(|w| {
+        w.bytes().cmp(word.bytes().map(|b| b.to_ascii_lowercase()))
+    }).is_ok()
+}
+
 impl Document {
     /// Document name generation.
     ///
@@ -449,22 +589,32 @@ impl Document {
     /// in lowercase and dash separated words, to simplify
     /// exploration using fzf, find or other tools.
     fn generate_name(&self) -> String {
-        let mut authors = self.authors.iter()
-            .map(|author| author.to_ascii_lowercase()
-                                .replace("  ", " ")
-                                .replace(' ', "-")
-                                .replace(',',"-"))
-            .collect::<Vec<String>>()
-            .join("-");
+        let mut authors = String::with_capacity(NAME_PART_LENGTH);
+        'authors: for (i, author) in self.authors.iter().enumerate() {
+            if i > 0 && !push_bounded(&mut authors, '-') { break; }
+            // a pair of spaces collapses into a single dash
+            let mut after_space = false;
+            for c in author.chars() {
+                let c = match c {
+                    ' ' if after_space => { after_space = false; continue; }
+                    ' ' => { after_space = true; '-' }
+                    ',' => { after_space = false; '-' }
+                    c   => { after_space = false; c.to_ascii_lowercase() }
+                };
+                if !push_bounded(&mut authors, c) { break 'authors; }
+            }
+        }
         let year = self.year;
-        let mut title : String = self.title
-                                 .to_ascii_lowercase()
-                                 .split_whitespace()
-                                 .filter(|x| x.len() > 0 && !STUPID_WORDS.contains(x))
-                                 .collect::<Vec<&str>>()
-                                 .join("-");
-        title.truncate(30); // Cannot fail because we have ascii code points
-        authors.truncate(30); // Cannot fail because we have ascii code points
+        // the words are lowercased while being pushed, the rest
+        // of the title is not even looked at once the part is full.
+        let mut title = String::with_capacity(NAME_PART_LENGTH);
+        'title: for word in self.title.split_whitespace() {
+            if is_stupid_word(word) { continue; }
+            if !title.is_empty() && !push_bounded(&mut title, '-') { break; }
+            for c in word.chars() {
+                if !push_bounded(&mut title, c.to_ascii_lowercase()) { break 'title; }
+            }
+        }
         let hash = &self.checksum;
         format!("{authors} {year} {title} {hash}.pdf")
     }
@@ -475,9 +625,16 @@ struct PageArgs {
     page: Option<u32>,
     dest: Option<String>,
 }
+/// Reads the page and named destination from the query of a link.
+///
+/// This is called for every link of a document, hence the query
+/// is located by hand instead of parsing the whole url.
 fn get_page_number(uri : &str, args : &mut CiteArgs) -> Result<()>{
-    let url = Url::parse(&uri).context("Parsing URL inside document")?;
-    let que = url.query().context("No query to parse")?;
+    // only urls carry a query: a local path may contain a '?'.
+    anyhow::ensure!(uri.contains("://"), "Not an url: {uri}");
+    // the fragment goes first: a '?' inside it is not a query.
+    let before_fragment = uri.split_once('#').map_or(uri, |(u, _)| u);
+    let (_, que) = before_fragment.split_once('?').context("No query to parse")?;
     let PageArgs { page, dest } : PageArgs = serde_urlencoded::from_str(que).context("Parsing URL query")?;
     args.page = page;
     args.dest = dest;
@@ -490,30 +647,80 @@ fn update_document_links(pdoc : &mut pdflib::PdfDocument, ident: Option<String>)
     // to set a "from" path!
     // TODO forward the dest and page from
     // the link to the citation command
+    //
+    // The same link often appears many times in a document
+    // (e.g. a reference cited on several pages), hence each
+    // distinct link is only rewritten once.
+    let rewritten : RefCell<HashMap<String, String>> = RefCell::new(HashMap::new());
     pdoc.update_links(&|e| {
+        // links that already point to akl (e.g. in a document
+        // that was converted before) are left as they are.
+        if e.starts_with("akl://") {
+            return e;
+        }
+        if let Some(link) = rewritten.borrow().get(&e) {
+            return link.clone();
+        }
         let mut args = CiteArgs { uri: e.clone(),
                                   dest: None,
                                   page: None,
                                   from: ident.clone()
         };
         get_page_number(&e, &mut args).unwrap_or(());
-        command_to_query(Commands::Open(args)).unwrap_or(e)
+        let link = command_to_query(Commands::Open(args)).unwrap_or_else(|_| e.clone());
+        rewritten.borrow_mut().insert(e, link.clone());
+        link
     }).unwrap();
 
 }
 
 fn update_document_dests(id : &str, pdoc : &mut pdflib::PdfDocument) {
-    pdoc.add_destinations_links(&|e : pdflib::NamedDestination| {
+    pdoc.add_destinations_links(&|e : &pdflib::NamedDestination| {
         command_to_query(Commands::Cite(CiteArgs {
             uri: id.into(),
-            dest: Some(e.name),
+            dest: Some(e.name.clone()),
             page: Some(e.page_num),
             from: None
         })).unwrap_or("".into())
     }).unwrap();
 }
 
-fn download_pdf_document(url : &str) -> Result<pdflib::PdfDocument> {
+/// Original bytes of a loaded document.
+enum OriginalFile {
+    /// A downloaded document, kept in a temporary file,
+    /// and hashed while it was downloaded.
+    Downloaded { file : tempfile::NamedTempFile, checksum : String },
+    /// A document that was already on the system, copied byte for
+    /// byte to the library: its raw file has the same checksum.
+    Local(PathBuf),
+}
+
+impl OriginalFile {
+    /// Stores the original bytes at the given path.
+    ///
+    /// Local files are copied by the kernel (copy_file_range
+    /// on Linux), without going through a user space buffer.
+    fn store(self, path : &Path) -> Result<()> {
+        match self {
+            OriginalFile::Downloaded { file, .. } => {
+                file.persist(path).context("Moving the downloaded file to the library")?;
+            }
+            OriginalFile::Local(p) => {
+                std::fs::copy(&p, path).context("Copying the original file to the library")?;
+            }
+        }
+        Ok(())
+    }
+}
+
+/// Size of the buffer between a download and the disk.
+const DOWNLOAD_BUFFER_SIZE : usize = 128 * 1024;
+
+/// Downloads a pdf document.
+///
+/// The response is streamed to a temporary file in `dir`, and
+/// hashed on the fly, before being parsed from that file.
+fn download_pdf_document(url : &str, dir : &Path) -> Result<(pdflib::PdfDocument, OriginalFile)> {
     log::debug!("Loading document from {url}");
     let client = reqwest::blocking::Client::new();
     let mut up = Url::parse(url)?;
@@ -524,8 +731,6 @@ fn download_pdf_document(url : &str) -> Result<pdflib::PdfDocument> {
           .header(reqwest::header::USER_AGENT, 
                   "Rust")
           .header(reqwest::header::ACCEPT, "*/*")
-          .header(reqwest::header::ACCEPT_ENCODING,
-                  "Accept-Encoding: gzip, deflate, br")
           .header(reqwest::header::ACCEPT_LANGUAGE,
                   "fr,fr-FR;q=0.8,en-US;q=0.5,en;q=0.3")
           .header(reqwest::header::REFERER, &orig)
@@ -534,11 +739,27 @@ fn download_pdf_document(url : &str) -> Result<pdflib::PdfDocument> {
           .header(reqwest::header::ORIGIN, &orig)
           .send()?;
 
-    log::debug!("Pdf Document downloaded !");
     log::debug!("Status {:?}", body.status());
+    // the body is streamed to the disk and hashed on the fly, do
+    // not spend this work on an error page that lopdf would reject.
+    let mut body = body.error_for_status()
+        .context("downloading the pdf document")?;
+
+    // the network hands out small reads, batch them
+    // into large writes to the disk.
+    let mut file = tempfile::NamedTempFile::new_in(dir)?;
+    let checksum = {
+        let mut writer = std::io::BufWriter::with_capacity(DOWNLOAD_BUFFER_SIZE, &mut file);
+        let checksum = pdflib::copy_and_hash(&mut body, &mut writer)
+            .context("downloading the pdf document")?;
+        writer.flush().context("writing the downloaded pdf document")?;
+        checksum
+    };
 
-    let pdf = lopdf::Document::load_from(body)
-        .context("parsing the pdf document in memory using lopdf")?;
+    log::debug!("Pdf Document downloaded !");
+
+    let pdf = lopdf::Document::load(file.path())
+        .context("parsing the downloaded pdf document using lopdf")?;
 
     log::debug!("Pdf Document parsed !");
 
@@ -547,20 +768,24 @@ fn download_pdf_document(url : &str) -> Result<pdflib::PdfDocument> {
 
     log::debug!("Pdf Document explored !");
 
-    Ok(doc)
+    Ok((doc, OriginalFile::Downloaded { file, checksum }))
 }
 
 
 /// Loads a pdf document. 
 /// Either from a url to download, an arxiv format,
 /// or simply from a valid filepath.
-fn load_pdf_document(uri : &str, identifiers : Option<&mut Vec<String>>) -> Result<pdflib::PdfDocument> {
-    match uri_or_filepath_dispatch(uri)? {
+///
+/// The document comes with its original file,
+/// downloaded documents being stored in `dir`.
+fn load_pdf_document(parsed : ParsedURI, identifiers : Option<&mut Vec<String>>, dir : &Path)
+    -> Result<(pdflib::PdfDocument, OriginalFile)> {
+    match parsed {
         ParsedURI::FilePath(p) => {
             log::debug!("Found a direct path to import!");
-            let pdf = lopdf::Document::load(p)?;
+            let pdf = lopdf::Document::load(&p)?;
             let doc = pdflib::PdfDocument::try_from(pdf)?;
-            Ok(doc)
+            Ok((doc, OriginalFile::Local(p)))
         }
         ParsedURI::Arxiv { arxiv_id, arxiv_version } => {
             log::debug!("Found a valid arixv link to import {arxiv_id} / {arxiv_version}!");
@@ -568,15 +793,14 @@ fn load_pdf_document(uri : &str, identifiers : Option<&mut Vec<String>>) -> Resu
                 ids.push(format!("arxiv:{}v{}", arxiv_id, arxiv_version));
             }
             let url = format!("https://arxiv.org/pdf/{}v{}.pdf", &arxiv_id, &arxiv_version);
-            download_pdf_document(&url)
-
+            download_pdf_document(&url, dir)
         }
         ParsedURI::HttpURL(url) => {
             log::debug!("This is a direct http request");
-            download_pdf_document(&url)
+            download_pdf_document(&url, dir)
         }
-        _ => {
-            anyhow::bail!("Cannot automatically download uri {}", &uri);
+        other => {
+            anyhow::bail!("Cannot automatically download uri {other:?}");
         }
     }
 }
@@ -626,6 +850,91 @@ fn view_pdf_file(path : &PathBuf, page : Option<u32>, dest: Option<String>) {
     }
 }
 
+/// Returns the modification time (in nanoseconds) and the size
+/// of a file, which identify a given version of its contents.
+fn file_stamp(path : &Path) -> Option<(u64, u64)> {
+    let meta = std::fs::metadata(path).ok()?;
+    let mtime = meta.modified().ok()?
+                    .duration_since(std::time::UNIX_EPOCH).ok()?;
+    Some((mtime.as_nanos().try_into().ok()?, meta.len()))
+}
+
+/// Key of a file in the cache of checksums: its canonical path,
+/// so that a file reached through different paths (e.g. through
+/// a symlinked data directory) has a single entry.
+fn checksum_key(path : &Path) -> Option<String> {
+    let path = std::fs::canonicalize(path).ok()?;
+    Some(path.to_string_lossy().into_owned())
+}
+
+/// Builds the cache entry remembering the checksum of a file.
+fn checksum_entry(path : &Path, checksum : &str) -> Option<(String, CachedChecksum)> {
+    let (mtime_ns, size) = file_stamp(path)?;
+    Some((checksum_key(path)?,
+          CachedChecksum { mtime_ns, size, checksum: checksum.into() }))
+}
+
+/// Loads the index of the library.
+///
+/// The index is stored as JSON, which is much faster to parse than
+/// YAML. Libraries still using the former `index.yaml` file are
+/// migrated on their first load.
+fn load_index(index_path : &Path, yaml_path : &Path) -> Vec<Document> {
+    // TODO: gracefully handle failure to parse the config
+    // the index is read directly, its absence being the rare case.
+    match std::fs::read(index_path) {
+        Ok(bytes) => { return serde_json::from_slice(&bytes).unwrap(); }
+        Err(e) if e.kind() == std::io::ErrorKind::NotFound => {}
+        Err(e) => { panic!("Cannot read the index {index_path:?}: {e}"); }
+    }
+
+    let index : Vec<Document> = if yaml_path.exists() {
+        log::info!("Migrating the index from {yaml_path:?} to {index_path:?}");
+        let bytes = std::fs::read(yaml_path).unwrap();
+        serde_yaml::from_slice(&bytes).unwrap()
+    } else {
+        vec![]
+    };
+    write_index(index_path, &index).unwrap();
+    index
+}
+
+/// Version of the index format.
+///
+/// 1. checksums of the documents as re-serialised by lopdf.
+/// 2. checksums of the raw files, that is, of the downloaded
+///    or copied bytes.
+const INDEX_VERSION : u32 = 2;
+
+/// Reads the version of the index, libraries
+/// predating the version file are at version 1.
+fn read_index_version(version_path : &Path) -> u32 {
+    std::fs::read_to_string(version_path)
+        .ok()
+        .and_then(|v| v.trim().parse().ok())
+        .unwrap_or(1)
+}
+
+/// Size of the buffers used to write the state of the library.
+const STATE_BUFFER_SIZE : usize = 128 * 1024;
+
+/// Atomically writes the index of the library.
+///
+/// The JSON is indented to keep the file readable and its
+/// history easy to diff.
+fn write_index(index_path : &Path, index : &[Document]) -> Result<()> {
+    let dir = index_path.parent()
+                        .context("Finding the directory of the index")?;
+    let mut file = tempfile::NamedTempFile::new_in(dir)?;
+    {
+        let mut writer = std::io::BufWriter::with_capacity(STATE_BUFFER_SIZE, &mut file);
+        serde_json::to_writer_pretty(&mut writer, index)?;
+        writer.flush()?;
+    }
+    file.persist(index_path)?;
+    Ok(())
+}
+
 impl AppState {
     fn new() -> Self {
         // find the correct path for the application stored state.
@@ -638,8 +947,11 @@ impl AppState {
         let mod_path   = pdirs.data_dir().join("mod");
         // TODO: in modern XDG, there is XDG_STATE_DIR
         // but this is not cross platform
-        let index_path = conf_path.join("index.yaml");
+        let index_path = conf_path.join("index.json");
+        let yaml_path  = conf_path.join("index.yaml");
+        let version_path = conf_path.join("index.version");
         let log_path   = pdirs.cache_dir().join("logs");
+        let checksums_path = pdirs.cache_dir().join("checksums.json");
 
         // ensures that the paths exists
         // TODO: postpone this check to times we actually need
@@ -649,38 +961,96 @@ impl AppState {
         std::fs::create_dir_all(&mod_path).unwrap();
         std::fs::create_dir_all(&log_path).unwrap();
 
-        // TODO: gracefully handle failure to parse the config
-        let index : Vec<Document> =
-            std::fs::OpenOptions::new()
-                .read(true)
-                .write(true)
-                .create(true)
-                .open(&index_path)
-                .map(serde_yaml::from_reader)
-                .unwrap()
-                .unwrap();
-
         AppState {
             index_path,
+            yaml_path,
+            version_path,
             raw_path,
             mod_path,
             log_path,
-            index,
+            checksums_path,
+            index: vec![],
+            checksums: HashMap::new(),
+            by_identifier: HashMap::new(),
+            by_checksum: HashMap::new(),
+            loaded: false,
+            index_dirty: false,
+            checksums_dirty: false,
+        }
+    }
+
+    /// Loads the index and the checksums of the library,
+    /// unless this was already done.
+    fn load(&mut self) {
+        if self.loaded {
+            return;
+        }
+        self.index = load_index(&self.index_path, &self.yaml_path);
+
+        // the cache is only an optimisation: start afresh
+        // if it is missing or cannot be parsed.
+        self.checksums = std::fs::read(&self.checksums_path)
+            .ok()
+            .and_then(|bytes| serde_json::from_slice(&bytes).ok())
+            .unwrap_or_default();
+
+        self.loaded = true;
+        self.reindex();
+
+        let version = read_index_version(&self.version_path);
+        if version < INDEX_VERSION {
+            log::info!("Migrating the index from version {version} to {INDEX_VERSION}");
+            // version 1 stored the checksum of the document as
+            // re-serialised by lopdf, not of its raw file.
+            self.rehash_all();
+            self.index_dirty = true;
         }
     }
 
+    /// Registers the document at position `i` of the index
+    /// in the lookup tables. When several documents share an
+    /// identifier, the first one wins.
+    fn register(&mut self, i : usize) {
+        let doc = &self.index[i];
+        for identifier in &doc.identifiers {
+            self.by_identifier.entry(identifier.clone()).or_insert(i);
+        }
+        self.by_checksum.entry(doc.checksum.clone()).or_default().push(i);
+    }
+
+    /// Rebuilds the lookup tables from scratch.
+    ///
+    /// The tables are sized upfront, so that building them
+    /// does not rehash every entry several times over.
+    fn reindex(&mut self) {
+        self.by_identifier.clear();
+        self.by_checksum.clear();
+        let identifiers = self.index.iter().map(|d| d.identifiers.len()).sum();
+        self.by_identifier.reserve(identifiers);
+        self.by_checksum.reserve(self.index.len());
+        for i in 0..self.index.len() {
+            self.register(i);
+        }
+    }
+
+    /// Finds the document having a given identifier.
+    fn lookup(&self, identifier : &str) -> Option<&Document> {
+        self.by_identifier.get(identifier).map(|&i| &self.index[i])
+    }
+
     /// Delete a document from the library
+    ///
+    /// The document is searched among those sharing its checksum
+    /// rather than in the whole index.
     fn delete(&mut self, doc : &Document) -> Result<()> {
-        let idx = self.index.iter()
-                      .enumerate()
-                      .find_map(|(i,d)| {
-                         if d.filename == doc.filename &&
-                            d.checksum == doc.checksum {
-                                Some(i)
-                         } else { None }
-                      });
+        let idx = self.by_checksum.get(&doc.checksum)
+                      .and_then(|group| group.iter()
+                                             .copied()
+                                             .find(|&i| self.index[i].filename == doc.filename));
         if let Some(index) = idx {
             self.index.swap_remove(index);
+            self.index_dirty = true;
+            self.reindex();
         }
         Ok(())
     }
@@ -688,43 +1058,145 @@ impl AppState {
 
     /// Finds a document in the library.
     /// This can be quite complex, but we do the bare minimum here.
-    fn find_document(&self, uri : &str) -> Result<&Document> {
-        let search_result = match uri_or_filepath_dispatch(uri)? {
+    fn find_document(&mut self, uri : &str) -> Result<&Document> {
+        match self.find_parsed(&uri_or_filepath_dispatch(uri)?) {
+            Some(r) => { Ok(r) }
+            None    => { anyhow::bail!("Could not find {uri} in the library.") }
+        }
+    }
+
+    /// Finds a document in the library from an already parsed uri.
+    ///
+    /// Files on the system are recognised by their checksum.
+    fn find_parsed(&mut self, parsed : &ParsedURI) -> Option<&Document> {
+        match parsed {
+            ParsedURI::FilePath(p) => {
+                let checksum = self.checksum_of(p).ok()?;
+                self.find_by_checksum(&checksum)
+            }
             ParsedURI::DOI(doi) => {
-                let doi = format!("doi:{doi}");
-                self.index.iter()
-                          .find(|doc| {
-                                    doc.identifiers.contains(&doi) })
+                self.lookup(&format!("doi:{doi}"))
             }
             ParsedURI::Arxiv { arxiv_version, arxiv_id } => {
-                let arxiv = format!("arxiv:{arxiv_id}v{arxiv_version}");
-                self.index.iter()
-                          .find(|doc| {
-                                    doc.identifiers.contains(&arxiv) })
+                self.lookup(&format!("arxiv:{arxiv_id}v{arxiv_version}"))
             }
             ParsedURI::HttpURL(url) => {
-                self.index.iter()
-                          .find(|doc| {
-                                    doc.identifiers.contains(&url) })
+                self.lookup(url)
             }
             _ => {
                 None
             }
-        };
+        }
+    }
 
-        match search_result {
-            Some(r) => { Ok(r) }
-            None    => { anyhow::bail!("Could not find {uri} in the library.") }
+    /// Looks up the checksum of a file in the cache,
+    /// provided that the file did not change since it was hashed.
+    fn cached_checksum(&self, path : &Path) -> Option<String> {
+        let (mtime_ns, size) = file_stamp(path)?;
+        self.checksums.get(&checksum_key(path)?)
+            .filter(|c| c.mtime_ns == mtime_ns && c.size == size)
+            .map(|c| c.checksum.clone())
+    }
+
+    /// Computes the checksum of a file, going through the cache.
+    ///
+    /// Opening or importing a file that was already seen
+    /// does not read it again, unless it was modified.
+    fn checksum_of(&mut self, path : &Path) -> Result<String> {
+        if let Some(checksum) = self.cached_checksum(path) {
+            return Ok(checksum);
+        }
+        let checksum = pdflib::sha256sum(path)
+            .with_context(|| format!("Hashing {}", path.display()))?;
+        if let Some((k, v)) = checksum_entry(path, &checksum) {
+            self.checksums.insert(k, v);
+            self.checksums_dirty = true;
         }
+        Ok(checksum)
+    }
+
+    /// Recompute the checksums of all the documents
+    /// in the library from their raw version.
+    ///
+    /// Files that did not change since they were last hashed
+    /// are not read again.
+    fn rehash_all(&mut self) {
+        let paths : Vec<PathBuf> = self.index.iter()
+            .map(|doc| self.raw_path.join(&doc.filename))
+            .collect();
+        let cached : Vec<Option<String>> = paths.iter()
+            .map(|p| self.cached_checksum(p))
+            .collect();
+        let misses : Vec<&PathBuf> = paths.iter()
+            .zip(&cached)
+            .filter(|(_, c)| c.is_none())
+            .map(|(p, _)| p)
+            .collect();
+        let mut computed = pdflib::sha256sum_batch(&misses).into_iter();
+
+        for ((doc, path), cached) in self.index.iter_mut().zip(&paths).zip(cached) {
+            let (checksum, fresh) = match cached {
+                Some(c) => { (Ok(c), false) }
+                None    => { (computed.next().unwrap(), true) }
+            };
+            match checksum {
+                Ok(c) => {
+                    if fresh {
+                        if let Some((k, v)) = checksum_entry(path, &c) {
+                            self.checksums.insert(k, v);
+                            self.checksums_dirty = true;
+                        }
+                    }
+                    if doc.checksum != c {
+                        doc.checksum = c;
+                        self.index_dirty = true;
+                    }
+                }
+                Err(e) => { log::error!("Could not hash {}: {e}", doc.filename); }
+            }
+        }
+        self.reindex();
+    }
+
+    /// Groups the documents of the library sharing the same checksum.
+    /// Only the groups with at least two documents are returned.
+    ///
+    /// The groups come in the order of the index, so that
+    /// the listing is the same from one run to the next.
+    fn duplicates(&self) -> Vec<Vec<&Document>> {
+        let mut groups : Vec<&Vec<usize>> = self.by_checksum.values()
+            .filter(|group| group.len() > 1)
+            .collect();
+        groups.sort_unstable_by_key(|group| group[0]);
+        groups.into_iter()
+            .map(|group| group.iter().map(|&i| &self.index[i]).collect())
+            .collect()
+    }
+
+    /// Finds a document having a given checksum.
+    fn find_by_checksum(&self, checksum : &str) -> Option<&Document> {
+        let &i = self.by_checksum.get(checksum)?.first()?;
+        Some(&self.index[i])
     }
 
     /// Add a document to the library.
     /// Assumes that the document is valid
     /// and is not already in the library.
-    fn add_document(&mut self, doc : Document, mut pdoc : pdflib::PdfDocument) -> Result<()> {
+    ///
+    /// The original file is used as the raw version of the document.
+    fn add_document(&mut self,
+                    doc : Document,
+                    mut pdoc : pdflib::PdfDocument,
+                    original : OriginalFile) -> Result<()> {
         let p = self.mod_path.join(&doc.filename);
         let r = self.raw_path.join(&doc.filename);
-        pdoc.save_to(&r).context("Saving the original file to the library")?;
+        original.store(&r).context("Saving the original file to the library")?;
+        // the raw file holds the bytes that were just hashed,
+        // remember it so that it is never hashed again.
+        if let Some((k, v)) = checksum_entry(&r, &doc.checksum) {
+            self.checksums.insert(k, v);
+            self.checksums_dirty = true;
+        }
 
         update_document_links(&mut pdoc, Some(doc.identifiers[0].clone()));
         update_document_dests(&doc.identifiers[0], &mut pdoc);
@@ -732,40 +1204,83 @@ impl AppState {
         pdoc.save_to(&p).context("Saving a modified file to the library")?;
 
         self.index.push(doc);
+        self.index_dirty = true;
+        self.register(self.index.len() - 1);
         Ok(())
     }
 
 
-    /// Saving the library to the yaml configuration file.
+    /// Saving the library to the json index file.
+    ///
+    /// Only what changed since the library was loaded is written,
+    /// commands that merely read the library do not write anything.
     fn save(&self) {
-        let file = std::fs::OpenOptions::new()
-            .write(true)
-            .read(false)
-            .append(false)
-            .open(&self.index_path).unwrap();
-        serde_yaml::to_writer(file, &self.index).unwrap();
+        if self.index_dirty {
+            write_index(&self.index_path, &self.index).unwrap();
+            std::fs::write(&self.version_path, INDEX_VERSION.to_string()).unwrap();
+        }
+
+        if self.checksums_dirty {
+            if let Err(e) = self.save_checksums() {
+                log::warn!("Could not save the checksums cache {e:?}");
+            }
+        }
+    }
+
+    /// Saving the cache of checksums, forgetting about
+    /// the files that no longer exist.
+    ///
+    /// The entries are serialised straight from the cache,
+    /// without building a filtered copy of it first.
+    fn save_checksums(&self) -> Result<()> {
+        let existing = self.checksums.iter()
+            .filter(|(p, _)| Path::new(p).exists());
+        // written aside and renamed, like the index: a crash or a
+        // concurrent akl process never leaves a truncated cache.
+        let dir = self.checksums_path.parent()
+                      .context("Finding the directory of the checksums cache")?;
+        let mut file = tempfile::NamedTempFile::new_in(dir)?;
+        {
+            let mut writer = std::io::BufWriter::with_capacity(STATE_BUFFER_SIZE, &mut file);
+            serde::Serializer::collect_map(&mut serde_json::Serializer::new(&mut writer), existing)?;
+            writer.flush()?;
+        }
+        file.persist(&self.checksums_path)?;
+        Ok(())
     }
 }
 
-fn import_document(app : &mut AppState, args : ImportArgs, interactive : bool) -> Result<String> {
+fn import_document(app : &mut AppState,
+                   args : ImportArgs,
+                   parsed : ParsedURI,
+                   interactive : bool) -> Result<String> {
     let ImportArgs { uri, authors, title, context, identifiers, year, view: _, force : _ }
     = args;
     // TODO: interactive update of the metadata using a text editor?
     // (detect if command line?)
     let mut t_identifiers = vec![];
-    let mut pdf = load_pdf_document(&uri, Some(&mut t_identifiers))?;
+    let (mut pdf, original) = load_pdf_document(parsed, Some(&mut t_identifiers), &app.raw_path)?;
     let met = pdf.get_meta_data()?;
 
     let t_authors  = if authors.len() > 0 { authors } else { met.authors };
     let t_title    = title.or(met.title).context("No title could be found")?;
-    let t_checksum = pdf.get_checksum()?;
+    let t_checksum = match &original {
+        OriginalFile::Downloaded { checksum, .. } => { checksum.clone() }
+        OriginalFile::Local(p) => { app.checksum_of(p)? }
+    };
+    // documents with the same contents are only reported, they
+    // can be listed afterwards using the duplicates command.
+    if let Some(same) = app.find_by_checksum(&t_checksum) {
+        log::info!("Document {} has the same contents as {uri}", same.filename);
+    }
     let t_filename = "".into();
 
-    t_identifiers.extend_from_slice(&met.identifiers);
-    t_identifiers.extend_from_slice(&identifiers);
+    t_identifiers.extend(met.identifiers);
+    t_identifiers.extend(identifiers);
     t_identifiers.push(uri);
+    // dedup only removes consecutive repetitions: sort first.
+    t_identifiers.sort_unstable();
     t_identifiers.dedup();
-    t_identifiers.sort();
 
     let mut t_context = vec![];
     t_context.extend_from_slice(&context);
@@ -801,16 +1316,45 @@ fn import_document(app : &mut AppState, args : ImportArgs, interactive : bool) -
     let name = doc.generate_name();
     doc.filename = name.clone();
 
-    app.add_document(doc, pdf)?;
+    app.add_document(doc, pdf, original)?;
     Ok(name)
 }
 
 fn execute_command(app : &mut AppState, cmd : Commands, interactive : bool) -> Result<()> {
     log::debug!("Executing command {cmd:?} in with interactive = {interactive}");
+    if cmd.needs_library() {
+        app.load();
+    }
     match cmd {
         Commands::Find => {
-            app.index.iter()
-                .for_each(|d| println!("{}",app.mod_path.join(&d.filename).to_string_lossy()));
+            // a single buffered output for the whole library, instead
+            // of locking and flushing stdout once per document.
+            let mut out = std::io::BufWriter::new(std::io::stdout().lock());
+            for d in &app.index {
+                writeln!(out, "{}", app.mod_path.join(&d.filename).to_string_lossy())?;
+            }
+            out.flush()?;
+        }
+        Commands::Duplicates(DuplicatesArgs { rehash }) => {
+            if rehash {
+                app.rehash_all();
+            }
+            let mut out = std::io::BufWriter::new(std::io::stdout().lock());
+            for group in app.duplicates() {
+                writeln!(out, "{}", group[0].checksum)?;
+                for d in group {
+                    writeln!(out, "\t{}", app.mod_path.join(&d.filename).to_string_lossy())?;
+                }
+            }
+            out.flush()?;
+        }
+        Commands::Export(ExportArgs { output }) => {
+            let file = std::fs::File::create(&output)
+                .context("Creating the exported index")?;
+            let mut writer = std::io::BufWriter::new(file);
+            serde_yaml::to_writer(&mut writer, &app.index)
+                .context("Exporting the index")?;
+            writer.flush().context("Writing the exported index")?;
         }
         Commands::Cite(CiteArgs { uri, page, dest, .. }) => {
             let mut ctx = ClipboardContext::new().unwrap();
@@ -823,9 +1367,9 @@ fn execute_command(app : &mut AppState, cmd : Commands, interactive : bool) -> R
                             ).unwrap();
         }
         Commands::Resolve(ResolveArgs { uri }) => {
-            match app.find_document(&uri) {
-                Ok(doc) => {
-                    println!("{:?}", &app.mod_path.join(&doc.filename));
+            match app.find_document(&uri).map(|doc| doc.filename.clone()) {
+                Ok(filename) => {
+                    println!("{:?}", &app.mod_path.join(filename));
                 }
                 Err(_) => {
                     println!("The document does not belong to the library");
@@ -836,19 +1380,19 @@ fn execute_command(app : &mut AppState, cmd : Commands, interactive : bool) -> R
             notifica::notify("🌍 Converting",
                              &format!("Processing {}", &uri)
                             ).unwrap();
-            let mut doc = load_pdf_document(&uri, None).unwrap();
-            let out_path = PathBuf::from(output);
+            let parsed = uri_or_filepath_dispatch(&uri)?;
+            let (mut doc, _) = load_pdf_document(parsed, None, &std::env::temp_dir()).unwrap();
             update_document_links(&mut doc, None);
-            doc.save_to(&out_path).unwrap();
+            doc.save_to(&output).unwrap();
             notifica::notify("🌍 Converting",
                              &format!("Finished processing {}", &uri)
                             ).unwrap();
         }
         Commands::Open(CiteArgs { uri ,page, dest, .. }) => {
-            match app.find_document(&uri) {
-                Ok(doc) => {
+            match app.find_document(&uri).map(|doc| doc.filename.clone()) {
+                Ok(filename) => {
                     log::debug!("Document {uri} already exists");
-                    view_pdf_file(&app.mod_path.join(&doc.filename), page, dest);
+                    view_pdf_file(&app.mod_path.join(filename), page, dest);
                 }
                 Err(_) => {
                     log::debug!("Document {uri} was not found");
@@ -865,23 +1409,27 @@ fn execute_command(app : &mut AppState, cmd : Commands, interactive : bool) -> R
                             )
                 .context("Notifying the user that the conversion started")?;
             log::info!("Importing document {}", import_args.uri);
-            let m_doc = app.find_document(&import_args.uri);
+            // the uri is parsed once, both to search the library
+            // and to load the document.
+            let parsed = uri_or_filepath_dispatch(&import_args.uri)?;
+            let m_doc = app.find_parsed(&parsed);
             let view = import_args.view;
             let name : String;
 
             match (m_doc, import_args.force) {
-                (Ok(doc), false) => {
+                (Some(doc), false) => {
                     log::info!("Document {} already in the library, but force set to false", import_args.uri);
                     name = doc.filename.clone();
                 }
-                (Ok(doc), true)  => {
+                (Some(doc), true)  => {
                     log::info!("Document {} already in the library, and force set to true", import_args.uri);
-                    app.delete(&doc.clone())?;
-                    name = import_document(app, import_args, interactive)?;
+                    let doc = doc.clone();
+                    app.delete(&doc)?;
+                    name = import_document(app, import_args, parsed, interactive)?;
                 }
-                (Err(_), _)    => {
+                (None, _)    => {
                     log::info!("Document {} is completely new", import_args.uri);
-                    name = import_document(app, import_args, interactive)?;
+                    name = import_document(app, import_args, parsed, interactive)?;
                 }
             };
 
@@ -902,6 +1450,10 @@ fn execute_command(app : &mut AppState, cmd : Commands, interactive : bool) -> R
 }
 
 fn main() {
+    // Parse the command line first: --help, --version and
+    // invalid arguments should not pay for loading the library.
+    let cli = Cli::parse();
+
     let mut app = AppState::new();
 
     let log = file_rotate::FileRotate::new(
@@ -919,11 +1471,9 @@ fn main() {
         .filter_level(log::LevelFilter::Debug)
         .init();
 
-    log::debug!("Parsing CLI");
+    log::debug!("Parsed CLI {cli:?}");
     //log::debug!("Current app state is {app:?}");
 
-    let cli = Cli::parse();
-
     match cli.execute_uri {
         Some(val) => {
             log::info!("Custom uri found {val:?}, will parse it.");
@@ -9,11 +9,21 @@ use lopdf::{Document, Dictionary, Object, ObjectId};
 
 // standard library tools
 use std::collections::HashMap;
+use std::io::{BufWriter, Read, Write};
 use std::path::Path;
 use chrono::Datelike;
 
 use sha2::{Digest,Sha256};
 
+/// Size of the chunks given to the SHA256 hasher.
+///
+/// Large chunks let sha2 compress long runs of blocks at once,
+/// which is where its SHA-NI backend (selected at runtime) shines.
+const HASH_BUFFER_SIZE : usize = 128 * 1024;
+
+/// Size of the buffer placed in front of a saved pdf file.
+const SAVE_BUFFER_SIZE : usize = 1024 * 1024;
+
 /// PdfLibError enumerates all possible errors returned by this library.
 #[derive(Error, Debug)]
 pub enum PdfLibError {
@@ -133,8 +143,8 @@ fn rectangle_link(rect : &RectangleObject, url : String) -> Vec<Object> {
         Object::Dictionary(dictionary! {
             "Type" => "Annot",
             "Subtype" => "Square",
-            "Rect" => rct.clone(),
-            "Border" => brd.clone(),
+            "Rect" => rct,
+            "Border" => brd,
             "IC" => clr
         })
     ]
@@ -176,10 +186,10 @@ fn array_of_named_dest_obj<'a>(doc : &'a Document,
 /// being an array. The values of the array are specified in Table 151.
 fn named_dest_of_object(doc : &Document,
                         pnum: &HashMap<ObjectId, u32>,
-                        key : &Object,
+                        key : &[u8],
                         obj : &Object,
 ) -> Result<NamedDestination,PdfLibError> {
-    let name = parse_text_string(as_name_or_str(key)?)?;
+    let name = parse_text_string(key)?;
 
     let mut top  : f32 = 10.0;
     let mut left : f32 = 10.0;
@@ -264,6 +274,21 @@ fn number_tree_iter<'a>(doc : &'a Document, tree: &'a Dictionary)
     }
 }
 
+/// Parses (name, destination) pairs into named destinations
+/// in a single pass. Destinations without a name cannot be
+/// referred to, and are skipped before being dereferenced.
+fn named_dests_of_pairs<'a, I>(pdf : &'a Document,
+                               pnum : &HashMap<ObjectId,u32>,
+                               pairs : I)
+    -> Result<Vec<NamedDestination>, PdfLibError>
+    where
+        I : Iterator<Item = Result<(&'a [u8], &'a Object), PdfLibError>>
+{
+    pairs.filter(|pair| !matches!(pair, Ok((name, _)) if name.is_empty()))
+         .map(|pair| pair.and_then(|(name, obj)| named_dest_of_object(pdf, pnum, name, obj)))
+         .collect()
+}
+
 /// Fetch the named destinations of a given PDF document.
 ///
 /// FIXME: for pdf 1.1 documents this was directly found as a
@@ -281,14 +306,14 @@ fn collect_named_destinations(pdf : &Document, pnum: &HashMap<ObjectId,u32>)
 
     // prefer the newer versions
     if let Ok(dests) = new_dests {
-        name_tree_iter(pdf, dests).map(|key_val|
-            named_dest_of_object(pdf, pnum, &key_val[0], &key_val[1])
-        ).collect()
+        named_dests_of_pairs(pdf, pnum, name_tree_iter(pdf, dests).map(|key_val|
+            Ok((as_name_or_str(&key_val[0])?, &key_val[1]))
+        ))
     // fallback for old documents
     } else if let Ok(dests) = old_dests {
-        dests.into_iter().map(|(k,v)| {
-            named_dest_of_object(pdf, pnum, &Object::Name(k.as_slice().to_vec()), v)
-        }).collect()
+        named_dests_of_pairs(pdf, pnum, dests.into_iter().map(|(k,v)| {
+            Ok((k.as_slice(), v))
+        }))
     // It is not a problem if such a dict does not exist!
     // we should not fail.
     } else {
@@ -298,27 +323,12 @@ fn collect_named_destinations(pdf : &Document, pnum: &HashMap<ObjectId,u32>)
 
 
 
-/// Iterate over the annotations that appear in a document
-/// we assume that annotations are always given as indirect objects
-/// (which I think is standard in pdf documents)
-fn page_annotations_iter<'a>(pdf: &'a Document) -> impl Iterator<Item = ObjectId> + 'a {
-    // iterate over the pages to get the arrays of annotations
-    pdf.page_iter().flat_map(move |page_id| {
-        let page_obj = pdf.get_dictionary(page_id)?;
-        page_obj.get_deref(b"Annots", pdf)
-                .and_then(Object::as_array)
-    // only select those objects that are indirect
-    }).flat_map(|page_ans| {
-        page_ans.iter().flat_map(Object::as_reference)
-    })
-}
-
 /// Appends annotation objets to a given page.
 /// The objects should probably be indirect references
 /// to previously added objets.
 fn append_annots_to_page(pdf : &mut Document,
                          page_id : ObjectId,
-                         elts: &mut Vec<Object>)
+                         elts: Vec<Object>)
 -> Result<(), PdfLibError> {
     let page = pdf.get_dictionary_mut(page_id)?;
     // if no array is present, create one
@@ -330,7 +340,7 @@ fn append_annots_to_page(pdf : &mut Document,
         Object::Array(_) => {
             let arr = page.get_mut(b"Annots")
                 .and_then(Object::as_array_mut)?;
-            Ok(arr.append(elts))
+            Ok(arr.extend(elts))
         }
         // Second case: the array is indirect
         Object::Reference(_) => {
@@ -338,7 +348,7 @@ fn append_annots_to_page(pdf : &mut Document,
                                 .and_then(Object::as_reference)
                                 .and_then(|k| pdf.get_object_mut(k))
                                 .and_then(Object::as_array_mut)?;
-            Ok(arr.append(elts))
+            Ok(arr.extend(elts))
         }
         // otherwise, we do not have a correct annotation array
         _ => {
@@ -348,12 +358,17 @@ fn append_annots_to_page(pdf : &mut Document,
 }
 
 
-/// Update the URL of one link according to the update function.
-fn update_link<F>(dct : &mut Dictionary, lik : &F) -> Result<(), PdfLibError>
+/// Tells whether a dictionary is a link annotation.
+fn is_annotation(dct : &Dictionary) -> bool {
+    matches!(dct.get(b"Type").and_then(Object::as_name), Ok(b"Annot"))
+        || matches!(dct.get(b"Subtype").and_then(Object::as_name), Ok(b"Link"))
+}
+
+/// Update the URL of one URI action according to the update function.
+fn update_link<F>(action : &mut Dictionary, lik : &F) -> Result<(), PdfLibError>
     where 
         F : Fn(String) -> String
 {
-    let action : &mut Dictionary = dct.get_mut(b"A").and_then(Object::as_dict_mut)?;
     if let Ok(raw_uri) = action.get(b"URI").and_then(Object::as_str) {
         let old_uri = parse_text_string(raw_uri)?;
         action.set("URI",
@@ -366,6 +381,97 @@ fn update_link<F>(dct : &mut Dictionary, lik : &F) -> Result<(), PdfLibError>
     Ok(())
 }
 
+//// Checksums
+
+/// Size of the chunks read from files when hashing them.
+///
+/// Reading from the disk is cheap compared to the network, so the
+/// chunks are bigger than `HASH_BUFFER_SIZE`: fewer system calls,
+/// while still fitting in the last level cache.
+const HASH_READ_BUFFER_SIZE : usize = 2 * 1024 * 1024;
+
+/// Hashes the file at `path` using `buffer` as the read buffer.
+fn sha256sum_with(path : &Path, buffer : &mut [u8]) -> Result<String, PdfLibError> {
+    let mut file = std::fs::File::open(path)?;
+    let mut hasher = Sha256::new();
+    loop {
+        match file.read(buffer) {
+            Ok(0) => { break; }
+            Ok(n) => { hasher.update(&buffer[..n]); }
+            Err(e) if e.kind() == std::io::ErrorKind::Interrupted => {}
+            Err(e) => { return Err(e.into()); }
+        }
+    }
+    Ok(format!("{:x}", hasher.finalize()))
+}
+
+/// Copies everything from `reader` to `writer`, and returns
+/// the SHA256 checksum of the bytes that went through.
+///
+/// This is used to hash a document while it is being
+/// downloaded and stored, rather than hashing it afterwards.
+pub fn copy_and_hash<R : Read, W : Write>(reader : &mut R, writer : &mut W)
+    -> Result<String, PdfLibError> {
+    let mut hasher = Sha256::new();
+    let mut buffer = vec![0; HASH_BUFFER_SIZE];
+    loop {
+        match reader.read(&mut buffer) {
+            Ok(0) => { break; }
+            Ok(n) => {
+                hasher.update(&buffer[..n]);
+                writer.write_all(&buffer[..n])?;
+            }
+            Err(e) if e.kind() == std::io::ErrorKind::Interrupted => {}
+            Err(e) => { return Err(e.into()); }
+        }
+    }
+    Ok(format!("{:x}", hasher.finalize()))
+}
+
+/// Computes the SHA256 checksum of a file.
+pub fn sha256sum(path : &Path) -> Result<String, PdfLibError> {
+    sha256sum_with(path, &mut vec![0; HASH_READ_BUFFER_SIZE])
+}
+
+/// Maximal number of threads hashing a batch of files.
+///
+/// Each thread owns its own read buffer, this bounds
+/// the memory used by a batch.
+const HASH_MAX_THREADS : usize = 8;
+
+/// Computes the SHA256 checksums of a batch of files.
+///
+/// The batch is split in contiguous chunks hashed by a few
+/// threads, overlapping disk reads and hashing across cores.
+/// Each thread shares a single read buffer among its files,
+/// so that scanning the library does not allocate once per document.
+pub fn sha256sum_batch<P : AsRef<Path> + Sync>(paths : &[P]) -> Vec<Result<String, PdfLibError>> {
+    let threads = std::thread::available_parallelism()
+                      .map_or(1, |n| n.get())
+                      .min(HASH_MAX_THREADS)
+                      .min(paths.len());
+    if threads <= 1 {
+        let mut buffer = vec![0; HASH_READ_BUFFER_SIZE];
+        return paths.iter()
+                    .map(|p| sha256sum_with(p.as_ref(), &mut buffer))
+                    .collect();
+    }
+    let chunk_size = (paths.len() + threads - 1) / threads;
+    std::thread::scope(|scope| {
+        let handles : Vec<_> = paths.chunks(chunk_size)
+            .map(|chunk| scope.spawn(move || {
+                let mut buffer = vec![0; HASH_READ_BUFFER_SIZE];
+                chunk.iter()
+                     .map(|p| sha256sum_with(p.as_ref(), &mut buffer))
+                     .collect::<Vec<_>>()
+            }))
+            .collect();
+        handles.into_iter()
+               .flat_map(|h| h.join().expect("A hashing thread panicked"))
+               .collect()
+    })
+}
+
 #[derive(Debug,Clone)]
 pub struct PdfMetaData {
     /// Potential title of the pdf file.
@@ -395,30 +501,22 @@ pub struct PdfDocument {
     //page_nums   : HashMap<ObjectId, u32>,
     /// Named destinations of the inner pdf.
     named_dests : Vec<NamedDestination>,
-    /// All the annotations that can be found in the document.
-    annotations : Vec<ObjectId>,
 }
 
 impl TryFrom<Document> for PdfDocument {
     type Error = PdfLibError;
     fn try_from(value: Document) -> Result<Self, Self::Error> {
         // Collect the pages and their respective numbers 
-        let mut page_nums = HashMap::new();
-        value.page_iter()
+        let page_nums : HashMap<ObjectId, u32> = value.page_iter()
              .enumerate()
-             .for_each(|(i, page_id)| {
-                 page_nums.insert(page_id, (i+1) as u32);
-             });
+             .map(|(i, page_id)| (page_id, (i+1) as u32))
+             .collect();
         // Collect the named destinations in some suitable vector
         let named_dests = collect_named_destinations(&value, &page_nums)?;
 
-        // Collect all the annotations present in the document
-        let annotations = page_annotations_iter(&value).collect();
-
         Ok(PdfDocument {
             pdf: value,
             named_dests,
-            annotations,
             //page_nums,
         })
     }
@@ -428,16 +526,6 @@ impl TryFrom<Document> for PdfDocument {
 
 impl PdfDocument {
 
-    /// Provides a checksum of the pdf contents
-    pub fn get_checksum(&mut self) -> Result<String, PdfLibError> {
-        let mut hasher = Sha256::new();
-        self.pdf.save_to(&mut hasher)?;
-        let checksum = hasher.finalize();
-        Ok(format!("{:x}", checksum))
-    }
-
-
-
     /// Extract Meta Data from the /Info field
     /// and the /Metadata XMP metadata if
     /// it exists.
@@ -488,9 +576,16 @@ impl PdfDocument {
 
 
     /// Save the pdf to a given file.
+    ///
+    /// lopdf serialises the document through a myriad of tiny
+    /// writes, they are batched by a large buffer before
+    /// reaching the file.
     pub fn save_to(&mut self, path : &Path) 
         -> Result<std::fs::File,PdfLibError> {
-        Ok(self.pdf.save(path)?)
+        let file = std::fs::File::create(path)?;
+        let mut writer = BufWriter::with_capacity(SAVE_BUFFER_SIZE, file);
+        self.pdf.save_to(&mut writer)?;
+        Ok(writer.into_inner().map_err(|e| e.into_error())?)
     }
 
 
@@ -498,7 +593,7 @@ impl PdfDocument {
     /// using the closure to build the external URLs.
     pub fn add_destinations_links<F>(&mut self, lik : F) -> Result<(), PdfLibError>
         where 
-            F : Fn(NamedDestination) -> String
+            F : Fn(&NamedDestination) -> String
     {
         // temporary rectangle object
         let mut rect = RectangleObject {
@@ -515,35 +610,56 @@ impl PdfDocument {
             rect.y_ll = destination.top - 10.0;
             rect.y_ur = destination.top - 5.0;
 
-            let mut ids = rectangle_link(&rect, lik(destination.clone()))
-                          .iter()
-                          .map(|obj| self.pdf.add_object(obj.clone()))
-                          .collect();
+            let ids = rectangle_link(&rect, lik(destination))
+                          .into_iter()
+                          .map(|obj| self.pdf.add_object(obj));
 
             page_annots.entry(destination.page)
-                       .or_insert(vec![])
-                       .append(&mut ids);
+                       .or_default()
+                       .extend(ids);
         });
 
-        // batch addition of the objects to the respective pages
-        page_annots.iter_mut().map(|(k,v)| {
-            let mut objs : Vec<Object> = v.iter()
-                .map(|&x| Object::Reference(x)).collect();
-            self.annotations.append(v);
-            append_annots_to_page(&mut self.pdf, *k, &mut objs)
+        // batch addition of the objects to the respective pages,
+        // the identifiers are moved rather than copied around.
+        page_annots.into_iter().map(|(k,v)| {
+            let objs : Vec<Object> = v.into_iter()
+                .map(Object::Reference).collect();
+            append_annots_to_page(&mut self.pdf, k, objs)
         }).collect()
     }
 
     /// Updates all external URL links inside the pdf document.
+    ///
+    /// Instead of following the annotations of every page, the
+    /// objects of the document are swept once, looking for
+    /// annotations. Only their actions are rewritten: the URI
+    /// actions of outlines, forms or the `OpenAction` are left as is.
     pub fn update_links<F>(&mut self, lik : &F) -> Result<(), PdfLibError>
         where 
             F : Fn(String) -> String
     {
-        for &annot in &self.annotations {
-            let mut_obj = self.pdf.get_object_mut(annot)
-                              .and_then(Object::as_dict_mut)?;
-            // We do not care if this operation fails
-            update_link(mut_obj, lik).unwrap_or(());
+        // actions stored as objects of their own,
+        // rewritten once the sweep is over.
+        let mut indirect : Vec<ObjectId> = Vec::new();
+        for obj in self.pdf.objects.values_mut() {
+            match obj.as_dict_mut() {
+                Ok(dct) if is_annotation(dct) => {
+                    match dct.get_mut(b"A") {
+                        Ok(Object::Reference(id)) => { indirect.push(*id) }
+                        Ok(Object::Dictionary(action)) => {
+                            // We do not care if this operation fails
+                            update_link(action, lik).unwrap_or(());
+                        }
+                        _ => {}
+                    }
+                }
+                _ => {}
+            }
+        }
+        for id in indirect {
+            if let Ok(action) = self.pdf.get_object_mut(id).and_then(Object::as_dict_mut) {
+                update_link(action, lik).unwrap_or(());
+            }
         }
         Ok(())
     }
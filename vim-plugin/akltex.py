@@ -1,30 +1,101 @@
 #!/usr/bin/env python3
+import os
 import sys
+import pickle
+import hashlib
 import pathlib
 import bibtexparser
 import subprocess
 from typing import List, Dict, Optional
 
 
-def find_citations(tex_root : pathlib.Path) -> List[Dict]:
+CACHE_DIR = pathlib.Path(os.environ.get("XDG_CACHE_HOME",
+                                        pathlib.Path.home() / ".cache")) / "akltex"
+
+# bump when the shape of the cached citations changes.
+CACHE_FORMAT = 2
+
+
+def entry_as_dict(entry) -> Dict:
+    """ A bibtexparser 2 entry, in the shape of a bibtexparser 1 entry.
+
+    bibtexparser 1 lowercases the field names, bibtexparser 2
+    keeps them as written in the bib file.
+    """
+    citation = { field.key.lower() : field.value for field in entry.fields }
+    citation["ID"] = entry.key
+    citation["ENTRYTYPE"] = entry.entry_type
+    return citation
+
+
+def parse_citations(bib_files : List[pathlib.Path]) -> List[Dict]:
     citations = []
-    for bib_file in tex_root.glob('**/*.bib'):
-        with open(bib_file,"r") as bibtex_file:
-            bib_database = bibtexparser.load(bibtex_file)
-            citations.extend(bib_database.entries)
+    # bibtexparser 2 splits the files by hand, which is much faster
+    # than the pyparsing grammar of bibtexparser 1.
+    fast_parser = hasattr(bibtexparser, "parse_file")
+    for bib_file in bib_files:
+        if fast_parser:
+            library = bibtexparser.parse_file(str(bib_file))
+            citations.extend(entry_as_dict(e) for e in library.entries)
+        else:
+            with open(bib_file,"r") as bibtex_file:
+                bib_database = bibtexparser.load(bibtex_file)
+                citations.extend(bib_database.entries)
+    return citations
+
+
+def find_citations(tex_root : pathlib.Path) -> List[Dict]:
+    """ Citations of all the bib files below tex_root.
+
+    Parsing bibtex is slow, so the parsed citations are kept in
+    CACHE_DIR, in a single file per tex_root, together with a
+    fingerprint of the bib files (path, modification time and size)
+    and of the parser: the cache is only used when none of them changed.
+    """
+    bib_files = sorted(tex_root.glob('**/*.bib'))
+    fingerprint = hashlib.sha1()
+    fingerprint.update(f"{CACHE_FORMAT}\0{getattr(bibtexparser, '__version__', '')}\0".encode())
+    for bib_file in bib_files:
+        st = bib_file.stat()
+        fingerprint.update(f"{bib_file.resolve()}\0{st.st_mtime_ns}\0{st.st_size}\0".encode())
+    root_key = hashlib.sha1(str(tex_root.resolve()).encode()).hexdigest()
+    cache_file = CACHE_DIR / f"{root_key}.pkl"
+
+    try:
+        with open(cache_file, "rb") as f:
+            cached_fingerprint, citations = pickle.load(f)
+        if cached_fingerprint == fingerprint.hexdigest():
+            return citations
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError, TypeError):
+        pass
+
+    citations = parse_citations(bib_files)
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_file, "wb") as f:
+            pickle.dump((fingerprint.hexdigest(), citations), f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, cache_file)
+    except OSError:
+        # the cache is only an optimisation
+        pass
     return citations
 
 
+def dmenu_line(citation : Dict) -> str:
+    ID      = citation.get("ID", None)
+    title   = citation.get("title", citation.get("booktitle", "-"))
+    authors = citation.get("author", "-")
+    year    = citation.get("year", "-")
+    line    = f"{ID}\t{year}\t{title[:30]}\t{authors}"
+    return line.replace('\n', ' ')
+
+
 def select_citation(citations : List[Dict]) -> Optional[str]:
-    dmenu_input = []
-    for citation in citations:
-        ID  = citation.get("ID", None)
-        title   = citation.get("title", citation.get("booktitle", "-"))
-        authors = citation.get("author", "-")
-        year    = citation.get("year", "-")
-        title = title[:30]
-        dmenu_input.append(f"{ID}\t{year}\t{title}\t{authors}")
-    options = '\n'.join(option.replace('\n', ' ') for option in dmenu_input)
+    # a single pass builds the rofi input, without an
+    # intermediate list of lines.
+    options = '\n'.join(map(dmenu_line, citations))
     cmd     = ["rofi",
                '-dmenu', '-p', "Select Citation", '-format', 's', '-i',
                '-lines', '5']